@@ -1,26 +1,41 @@
 from fastapi import APIRouter
 from fastapi.responses import RedirectResponse
 import os
+from urllib.parse import urlencode
 import httpx
 from fastapi import Request, HTTPException
 from fastapi import Response
 from app.core.jwt_auth import create_jwt
+from app.services.session_store import SessionStoreUnavailable
 from fastapi import Cookie
 
 router = APIRouter(prefix="/api/auth/github", tags=["auth"])
 
-# Simple in-memory session store for demo (not production!)
-sessions = {}
+# OAuth config is read once at import (main.py validates these are set)
+CLIENT_ID = os.environ["GITHUB_CLIENT_ID"]
+CLIENT_SECRET = os.environ["GITHUB_CLIENT_SECRET"]
+REDIRECT_URI = "http://localhost:8000/api/auth/github/callback"
+FRONTEND_URL = "http://localhost:5173/"
+SECURE_COOKIE = os.environ.get("ENV") == "production"
+GITHUB_TOKEN_URL = "https://github.com/login/oauth/access_token"
+GITHUB_USER_URL = "https://api.github.com/user"
+
+# Built once at import; urlencode escapes the redirect URI and the
+# space-separated scopes. 'contents:write' is needed for creating branches.
+GITHUB_OAUTH_URL = "https://github.com/login/oauth/authorize?" + urlencode(
+    {
+        "client_id": CLIENT_ID,
+        "redirect_uri": REDIRECT_URI,
+        "scope": "read:user repo contents:write",
+    }
+)
+
+# Sessions (app.state.sessions) expire together with the access_token cookie
+SESSION_MAX_AGE = 14 * 24 * 3600
 
 @router.get("/login")
 async def github_login():
-    client_id = os.environ["GITHUB_CLIENT_ID"]
-    redirect_uri = "http://localhost:8000/api/auth/github/callback"
-    # Add 'contents:write' scope for creating branches
-    github_oauth_url = (
-        f"https://github.com/login/oauth/authorize?client_id={client_id}&redirect_uri={redirect_uri}&scope=read:user repo contents:write"
-    )
-    return RedirectResponse(github_oauth_url)
+    return RedirectResponse(GITHUB_OAUTH_URL)
 
 @router.get("/callback")
 async def github_callback(request: Request):
@@ -31,52 +46,52 @@ async def github_callback(request: Request):
     code = request.query_params.get("code")
     if not code:
         raise HTTPException(status_code=400, detail="No code in callback.")
-    client_id = os.environ["GITHUB_CLIENT_ID"]
-    client_secret = os.environ["GITHUB_CLIENT_SECRET"]
-    token_url = "https://github.com/login/oauth/access_token"
-    async with httpx.AsyncClient() as client:
-        headers = {"Accept": "application/json"}
-        data = {
-            "client_id": client_id,
-            "client_secret": client_secret,
-            "code": code,
-            "redirect_uri": "http://localhost:8000/api/auth/github/callback",
-        }
-        response = await client.post(token_url, data=data, headers=headers)
-        response.raise_for_status()
-        token_data = response.json()
+    # Both calls below go through the shared pooled client from the app lifespan,
+    # so the /user request reuses warm connections instead of a new handshake
+    client: httpx.AsyncClient = request.app.state.http
+    data = {
+        "client_id": CLIENT_ID,
+        "client_secret": CLIENT_SECRET,
+        "code": code,
+        "redirect_uri": REDIRECT_URI,
+    }
+    response = await client.post(GITHUB_TOKEN_URL, data=data, headers={"Accept": "application/json"})
+    if response.status_code != 200:
+        raise HTTPException(status_code=502, detail="GitHub token exchange failed.")
+    token_data = response.json()
     access_token = token_data.get("access_token")
     if not access_token:
         raise HTTPException(status_code=400, detail="No access token obtained.")
     
     # Use the access token to get the GitHub user info, create a JWT for your app,
     # set it as an HttpOnly cookie and redirect the user to the app root.
-    async with httpx.AsyncClient() as client:
-        user_resp = await client.get(
-            "https://api.github.com/user",
-            headers={"Authorization": f"token {access_token}", "Accept": "application/json"},
-        )
-        user_resp.raise_for_status()
-        user = user_resp.json()
+    user_resp = await client.get(
+        GITHUB_USER_URL,
+        headers={"Authorization": f"token {access_token}", "Accept": "application/json"},
+    )
+    if user_resp.status_code != 200:
+        raise HTTPException(status_code=502, detail="Failed to fetch GitHub user.")
+    user = user_resp.json()
 
     # Choose a user identifier to encode in the JWT (id or login)
     # Normalize to string to avoid int/str mismatches when looking up sessions
     github_user_id = str(user.get("id") or user.get("login"))
     # Store user's GitHub access token server-side (DO NOT put in JWT)
-    sessions[github_user_id] = {"github_token": access_token}
+    try:
+        await request.app.state.sessions.set_github_token(github_user_id, access_token)
+    except SessionStoreUnavailable:
+        raise HTTPException(status_code=503, detail="Session store unavailable, try again.")
     jwt_token = create_jwt(github_user_id)
 
-    resp = RedirectResponse("http://localhost:5173/repos")
-    # In production set secure=True and consider SameSite and domain restrictions
-    secure_cookie = os.environ.get("ENV") == "production"
-    resp = RedirectResponse("http://localhost:5173/")  # Redirect to frontend root
+    # In production also consider SameSite and domain restrictions
+    resp = RedirectResponse(FRONTEND_URL)  # Redirect to frontend root
     resp.set_cookie(
         key="access_token",
         value=jwt_token,
         httponly=True,
-        secure=False,  # False for localhost/dev
+        secure=SECURE_COOKIE,  # False for localhost/dev (ENV != production)
         samesite="lax",
-        max_age=14 * 24 * 3600,
+        max_age=SESSION_MAX_AGE,
         path="/",
     )
     return resp
@@ -1,10 +1,14 @@
+from typing import Optional
 from fastapi import APIRouter, Cookie, HTTPException, Depends
-from app.core.jwt_auth import verify_jwt
+from app.core.dependencies import verified_payload
 
 router = APIRouter(prefix="/api", tags=["profile"])
 
 
-def get_current_user(access_token: str = Cookie(None)):
+async def get_current_user(
+    access_token: str = Cookie(None),
+    payload: Optional[dict] = Depends(verified_payload),
+):
     """Dependency that verifies JWT from the `access_token` cookie.
 
     Raises HTTP 401 when token is missing/invalid.
@@ -12,7 +16,6 @@ def get_current_user(access_token: str = Cookie(None)):
     """
     if not access_token:
         raise HTTPException(status_code=401, detail="Missing access token cookie.")
-    payload = verify_jwt(access_token)
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid or expired token.")
     return payload
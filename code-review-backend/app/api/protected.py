@@ -8,7 +8,7 @@ router = APIRouter()
 security = HTTPBearer()
 
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Dependency that validates a JWT passed in the Authorization header.
 
     Raises HTTP 401 if token is missing/invalid. Returns the user id (sub claim).
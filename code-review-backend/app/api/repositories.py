@@ -1,19 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, Cookie
-from app.core.jwt_auth import verify_jwt
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+import httpx
+from app.core.dependencies import get_session_store, verified_payload
+from app.core.http_client import get_http_client
 from app.services.github_client import GitHubClient
-from app.api.auth import sessions
+from app.services.session_store import SessionStore
 
 router = APIRouter(prefix="/api/repos", tags=["repositories"])
 
 
 # Dependency to get user's access token from cookie/JWT
-def get_github_token(access_token: str = Cookie(None)):
-    payload = verify_jwt(access_token)
+async def get_github_token(
+    payload: Optional[dict] = Depends(verified_payload),
+    sessions: SessionStore = Depends(get_session_store),
+):
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid or expired token.")
     # normalize the user id to string to match how we store sessions
     user_id = str(payload["sub"]) if payload is not None else None
-    github_token = sessions.get(user_id, {}).get("github_token")
+    github_token = await sessions.github_token(user_id)
     if not github_token:
         raise HTTPException(status_code=401, detail="No GitHub token found.")
     return github_token
@@ -24,8 +29,9 @@ async def connect_repo(
     owner: str,
     repo: str,
     github_token: str = Depends(get_github_token),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
 ):
-    client = GitHubClient(github_token)
+    client = GitHubClient(github_token, http_client)
     repos = await client.list_repos()
     # Optionally verify the user owns the repo, then fetch files
     files = await client.get_repo_contents(owner, repo)
@@ -33,15 +39,24 @@ async def connect_repo(
 
 
 @router.get("/list")
-async def list_user_repos(github_token: str = Depends(get_github_token)):
+async def list_user_repos(
+    github_token: str = Depends(get_github_token),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
+):
     """Return a list of the user's GitHub repositories using their token."""
-    client = GitHubClient(github_token)
+    client = GitHubClient(github_token, http_client)
     repos = await client.list_repos()
     return {"repos": repos}
 
 # List files/folders at path (default 892 root)
 @router.get("/{owner}/{repo}/contents")
-async def list_contents(owner: str, repo: str, path: str = "", github_token: str = Depends(get_github_token)):
-    client = GitHubClient(github_token)
+async def list_contents(
+    owner: str,
+    repo: str,
+    path: str = "",
+    github_token: str = Depends(get_github_token),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
+):
+    client = GitHubClient(github_token, http_client)
     files = await client.get_repo_contents(owner, repo, path)
     return files
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, HTTPException, Cookie
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Cookie, Depends, Header
+from fastapi.responses import StreamingResponse
+from typing import Awaitable, List, Optional
+import asyncio
 import httpx
 import logging
-import re
+import orjson
+import os
 
-from app.core.jwt_auth import verify_jwt
+from app.core.dependencies import get_session_store, verified_payload
+from app.core.http_client import get_http_client
 from app.services.github_client import GitHubClient
 from app.services.rag_service import (
     chunk_java_file,
@@ -13,265 +16,383 @@ from app.services.rag_service import (
     chunk_python_file,
     chunk_typescript_file,
     chunk_generic_file,
+    cached_chunks,
+    batch_chunks,
 )
-from app.services.llm_service import review_code_chunk_with_context, parse_individual_issues
-from app.api.auth import sessions
+from app.services.llm_service import parse_individual_issues
+from app.services.llm_cache import cached_review
 from app.services.pr_publisher import PRPublisher
 from app.services.pr_creator import PRCreator
 from app.services.code_applier import CodeApplier
-from app.models import FileRef, ApplySuggestionRequest, ReviewRequest, CreatePRWithChangesRequest
+from app.services.session_store import SessionStore
+from app.models import (
+    FileRef,
+    ApplySuggestionRequest,
+    ReviewRequest,
+    CreatePRWithChangesRequest,
+    PRPublishRequest,
+    CreatePRRequest,
+)
 
 router = APIRouter(prefix="/api/reviews", tags=["reviews"])
 
+# Infrastructure files never sent for review (test files ARE reviewed)
+SKIP_FILES = frozenset({"auth.py", "protected.py", "jwt_auth.py", "__init__.py"})
 
-class PublishSuggestion(BaseModel):
-    file: str
-    comment: str
-    line: Optional[int] = None
-    highlighted_lines: Optional[List[int]] = None
-
-
-class PublishRequest(BaseModel):
-    owner: str
-    repo: str
-    pull_number: int
-    suggestions: List[PublishSuggestion]
-
+# ApprovedChange fields PRCreator needs to commit a change
+APPROVED_CHANGE_FIELDS = {"file", "original_content", "modified_content", "suggestion"}
 
-class CreatePRRequest(BaseModel):
-    owner: str
-    repo: str
-    branch_name: Optional[str] = None
-    title: Optional[str] = None
-    body: Optional[str] = None
+# Max GitHub content fetches in flight per review request (GitHub rate limits)
+GITHUB_FETCH_CONCURRENCY = 10
 
+# Consecutive chunks sent to the LLM as one review call (opt-in). A batch is
+# reviewed as one larger slice: it shares one 1500-token response and the
+# "no issues" filtering, so findings can be cut short or dropped for the
+# whole batch. 1 reviews every chunk separately.
+REVIEW_BATCH_SIZE = int(os.getenv("REVIEW_BATCH_SIZE", "1"))
 
-def get_language_and_chunks(file_path: str, content: str):
-    """
-    Determine language from file extension and return appropriate chunks.
+# Files at least this large are chunked in a worker thread so hashing and
+# slicing them doesn't stall other requests on the event loop
+CHUNK_IN_THREAD_CHARS = 500_000
 
-    Returns:
-        tuple: (language: str, chunks: List[str])
-    """
-    if file_path.endswith(".java"):
-        return "java", chunk_java_file(content)
-    elif file_path.endswith(".js"):
-        return "javascript", chunk_js_file(content)
-    elif file_path.endswith(".jsx"):
-        return "javascript", chunk_js_file(content)
-    elif file_path.endswith(".ts"):
-        return "typescript", chunk_typescript_file(content)
-    elif file_path.endswith(".tsx"):
-        return "typescript", chunk_typescript_file(content)
-    elif file_path.endswith(".py"):
-        return "python", chunk_python_file(content)
-    else:
-        return "text", chunk_generic_file(content)
+# Max LLM calls in flight per review request, across all files (tune to provider QPS)
+REVIEW_LLM_CONCURRENCY = int(os.getenv("REVIEW_MAX_CONCURRENCY", "8"))
 
 
-@router.post("/start")
-async def start_review(
-    request: ReviewRequest,
+async def require_github_token(
     access_token: Optional[str] = Cookie(None),
-):
-    """Start a code review for the specified files with PROJECT CONTEXT"""
+    payload: Optional[dict] = Depends(verified_payload),
+    sessions: SessionStore = Depends(get_session_store),
+) -> str:
+    """Dependency resolving the caller's GitHub token from their session, or 401."""
     if not access_token:
         raise HTTPException(status_code=401, detail="Missing access token")
 
-    payload = verify_jwt(access_token)
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user_id = str(payload["sub"])
-    github_token = sessions.get(user_id, {}).get("github_token")
+    github_token = await sessions.github_token(str(payload["sub"]))
     if not github_token:
         raise HTTPException(status_code=401, detail="No GitHub token found")
+    return github_token
 
-    client = GitHubClient(github_token)
 
-    review_results = {"review": []}
+# File extension -> (language, chunker)
+LANGUAGE_CHUNKERS = {
+    ".java": ("java", chunk_java_file),
+    ".js": ("javascript", chunk_js_file),
+    ".jsx": ("javascript", chunk_js_file),
+    ".ts": ("typescript", chunk_typescript_file),
+    ".tsx": ("typescript", chunk_typescript_file),
+    ".py": ("python", chunk_python_file),
+}
+DEFAULT_LANGUAGE_CHUNKER = ("text", chunk_generic_file)
 
-    # First pass: Fetch all file contents to build project context
-    project_context = {
-        "files": {},
-        "structure": [],
-    }
 
-    # Updated skip list - only skip infrastructure files, NOT test files
-    SKIP_FILES = [
-        "auth.py",
-        "protected.py",
-        "jwt_auth.py",
-        "__init__.py",
-    ]
+def get_language_and_chunks(file_path: str, content: str):
+    """
+    Determine language from file extension and return appropriate chunks.
 
-    for file_ref in request.files:
-        filename = file_ref.path.split("/")[-1]
+    Returns:
+        tuple: (language: str, chunks: List[(chunk: str, start_line: int)])
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    language, chunker = LANGUAGE_CHUNKERS.get(extension, DEFAULT_LANGUAGE_CHUNKER)
+    return language, cached_chunks(chunker, content)
 
-        if filename in SKIP_FILES:
-            logging.info(f"Skipping infrastructure file: {file_ref.path}")
-            continue
 
-        try:
-            content = await client.get_file_content(
-                file_ref.owner,
-                file_ref.repo,
-                file_ref.path,
-            )
-            project_context["files"][file_ref.path] = content
-            project_context["structure"].append(file_ref.path)
-            logging.info(f"Fetched {file_ref.path}: {len(content)} chars")
-        except Exception as e:
-            logging.error(f"Failed to fetch {file_ref.path}: {e}")
-            review_results["review"].append(
-                {
-                    "file": file_ref.path,
-                    "error": f"Failed to fetch file: {str(e)}",
-                }
-            )
+async def _language_and_chunks(file_path: str, content: str):
+    """`get_language_and_chunks`, run in a worker thread for very large files."""
+    if len(content) >= CHUNK_IN_THREAD_CHARS:
+        return await asyncio.to_thread(get_language_and_chunks, file_path, content)
+    return get_language_and_chunks(file_path, content)
 
-    # Build context summary
-    context_summary = (
-        f"Project structure: {', '.join(project_context['structure'])}\n"
-    )
-    context_summary += f"Total files in context: {len(project_context['files'])}\n"
 
-    # Second pass: Review each file with full project context
-    for file_path, content in project_context["files"].items():
-        try:
-            language, chunks = get_language_and_chunks(file_path, content)
+async def _review_file(
+    file_path: str,
+    content: str,
+    llm_sem: asyncio.Semaphore,
+    base_content: Optional[str] = None,
+) -> Optional[dict]:
+    """
+    Review one file's chunks and collect its HIGH/MEDIUM findings.
 
-            file_reviews: List[dict] = []
+    Chunk reviews run concurrently; `llm_sem` is shared by every file in the
+    request so it caps the total number of LLM calls in flight. Chunks that
+    also occur verbatim in `base_content` are unchanged and not reviewed.
 
-            for i, chunk in enumerate(chunks):
-                # NOTE: assumes each chunk is <= 1000 lines
-                start_line = i * 1000 + 1
+    Returns:
+        dict: {"file", "results"} with findings, {"file", "error"} on failure,
+        or None when the file has no issues.
+    """
+    try:
+        language, chunks = await _language_and_chunks(file_path, content)
+        chunks = batch_chunks(chunks, REVIEW_BATCH_SIZE)
+
+        if base_content is not None:
+            _, base_chunks = await _language_and_chunks(file_path, base_content)
+            unchanged = {chunk for chunk, _ in batch_chunks(base_chunks, REVIEW_BATCH_SIZE)}
+            changed = [(chunk, start) for chunk, start in chunks if chunk not in unchanged]
+            logging.info(
+                "%s: %d of %d chunks unchanged from base, skipped",
+                file_path,
+                len(chunks) - len(changed),
+                len(chunks),
+            )
+            chunks = changed
 
-                review = await review_code_chunk_with_context(
+        async def review_chunk(chunk: str, start_line: int) -> dict:
+            async with llm_sem:
+                return await cached_review(
                     chunk=chunk,
                     language=language,
                     start_line=start_line,
                     file_path=file_path,
-                    project_context=context_summary,
-                    full_file_content=content,
                 )
 
-                # Only include reviews with actual findings
-                if review.get("severity") in ["HIGH", "MEDIUM"] and review.get("comment"):
-                    # Parse individual issues from the LLM response
-                    individual_issues = parse_individual_issues(
-                        llm_response=review["comment"],
-                        original_code=content,
-                        file_path=file_path,
-                    )
+        # gather preserves chunk order in the results. A failed chunk must not
+        # fail the file (or leave its siblings running unawaited), so
+        # exceptions come back as results and are skipped here.
+        results = await asyncio.gather(
+            *(review_chunk(chunk, start_line) for chunk, start_line in chunks),
+            return_exceptions=True,
+        )
+        reviews = []
+        failures = []
+        for result in results:
+            if isinstance(result, Exception):
+                failures.append(result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                reviews.append(result)
+        if failures:
+            logging.error(
+                "%d of %d chunk reviews failed in %s: %s",
+                len(failures),
+                len(results),
+                file_path,
+                failures[0],
+            )
+            if not reviews:
+                # Nothing was reviewed: report the file as failed, not clean
+                raise failures[0]
+
+        file_reviews: List[dict] = []
+        content_lines: Optional[List[str]] = None  # split once, shared by all chunks
+
+        for review in reviews:
+            # Only include reviews with actual findings
+            if review.get("severity") in ["HIGH", "MEDIUM"] and review.get("comment"):
+                if content_lines is None:
+                    content_lines = content.splitlines()
+                # Parse individual issues from the LLM response; the fuzzy
+                # snippet matching is CPU-bound, so keep it off the event loop
+                individual_issues = await asyncio.to_thread(
+                    parse_individual_issues,
+                    llm_response=review["comment"],
+                    original_code=content,
+                    file_path=file_path,
+                    orig_lines=content_lines,
+                )
 
-                    if individual_issues:
-                        # Add each parsed issue as a separate entry
-                        for issue in individual_issues:
-                            file_reviews.append(
-                                {
-                                    "comment": issue["comment"],
-                                    "diff": issue["diff"],
-                                    "highlighted_lines": issue["highlighted_lines"],
-                                    "severity": issue["severity"],
-                                    "has_code_block": issue["has_code_block"],
-                                }
-                            )
-                            logging.info(
-                                f"Found {issue['severity']} issue in {file_path}"
-                            )
-                    else:
-                        # Fallback: if parsing fails but chunk says HIGH/MEDIUM, keep the chunk as a single issue
-                        file_reviews.append(
-                            {
-                                "comment": review["comment"],
-                                "diff": "",
-                                "highlighted_lines": review.get("lines") or [],
-                                "severity": review["severity"],
-                                "has_code_block": review.get("has_code_block", False),
-                            }
-                        )
+                if individual_issues:
+                    # Parsed issues already have the result shape; add them as-is
+                    file_reviews.extend(individual_issues)
+                    for issue in individual_issues:
                         logging.info(
-                            f"Fallback: treated entire chunk as single {review['severity']} issue in {file_path}"
+                            "Found %s issue in %s", issue["severity"], file_path
                         )
+                else:
+                    # Fallback: if parsing fails but chunk says HIGH/MEDIUM, keep the chunk as a single issue
+                    file_reviews.append(
+                        {
+                            "comment": review["comment"],
+                            "diff": "",
+                            "highlighted_lines": review.get("lines") or [],
+                            "severity": review["severity"],
+                            "has_code_block": review.get("has_code_block", False),
+                        }
+                    )
+                    logging.info(
+                        "Fallback: treated entire chunk as single %s issue in %s",
+                        review["severity"],
+                        file_path,
+                    )
 
-            if file_reviews:
-                review_results["review"].append(
-                    {
-                        "file": file_path,
-                        "results": file_reviews,
-                    }
-                )
-                logging.info(
-                    f"✅ Completed review of {file_path}: {len(file_reviews)} findings"
+        if file_reviews:
+            logging.info(
+                "Completed review of %s: %d findings", file_path, len(file_reviews)
+            )
+            return {
+                "file": file_path,
+                "results": file_reviews,
+            }
+
+        logging.info("No issues found in %s", file_path)
+        return None
+
+    except Exception as e:
+        logging.exception("Error reviewing %s: %s", file_path, e)
+        return {
+            "file": file_path,
+            "error": f"Review failed: {str(e)}",
+        }
+
+
+def _file_reviews(
+    request: ReviewRequest,
+    github_token: str,
+    http_client: httpx.AsyncClient,
+) -> List[Awaitable[Optional[dict]]]:
+    """
+    One fetch-then-review coroutine per reviewable file in `request`.
+
+    Each resolves to the file's review entry, or None when it has no issues.
+    """
+    client = GitHubClient(github_token, http_client)
+
+    targets = {}
+    for file_ref in request.files:
+        if file_ref.path.rpartition("/")[2] in SKIP_FILES:
+            logging.info("Skipping infrastructure file: %s", file_ref.path)
+            continue
+        targets[file_ref.path] = file_ref
+
+    fetch_sem = asyncio.Semaphore(GITHUB_FETCH_CONCURRENCY)
+    llm_sem = asyncio.Semaphore(REVIEW_LLM_CONCURRENCY)
+
+    async def fetch(file_ref: FileRef, ref: Optional[str] = None) -> str:
+        async with fetch_sem:
+            return await client.get_file_content(
+                file_ref.owner, file_ref.repo, file_ref.path, ref=ref
+            )
+
+    async def fetch_and_review(file_ref: FileRef) -> Optional[dict]:
+        base_content = None
+        try:
+            if request.base_sha:
+                content, base_content = await asyncio.gather(
+                    fetch(file_ref),
+                    fetch(file_ref, request.base_sha),
+                    return_exceptions=True,
                 )
+                if isinstance(content, Exception):
+                    raise content
+                if isinstance(base_content, Exception):
+                    # e.g. the file is new in this branch: review all of it
+                    logging.info("No base version of %s: %s", file_ref.path, base_content)
+                    base_content = None
             else:
-                logging.info(f"✅ No issues found in {file_path}")
-
+                content = await fetch(file_ref)
         except Exception as e:
-            logging.exception(f"Error reviewing {file_path}: {e}")
-            review_results["review"].append(
-                {
-                    "file": file_path,
-                    "error": f"Review failed: {str(e)}",
-                }
-            )
+            logging.error("Failed to fetch %s: %s", file_ref.path, e)
+            return {
+                "file": file_ref.path,
+                "error": f"Failed to fetch file: {str(e)}",
+            }
+
+        logging.info("Fetched %s: %d chars", file_ref.path, len(content))
+        return await _review_file(
+            file_ref.path, content, llm_sem, base_content
+        )
+
+    # Each file's chunk reviews start as soon as its own fetch completes
+    return [fetch_and_review(file_ref) for file_ref in targets.values()]
+
+
+@router.post("/start")
+async def start_review(
+    request: ReviewRequest,
+    github_token: str = Depends(require_github_token),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
+):
+    """Start a code review for the specified files"""
+    # gather keeps results in request order
+    file_results = await asyncio.gather(
+        *_file_reviews(request, github_token, http_client)
+    )
+
+    review_results = {"review": [r for r in file_results if r is not None]}
 
     return review_results
 
 
-@router.post("/publish")
-async def publish_review(
-    request: PublishRequest,
-    access_token: Optional[str] = Cookie(None),
+@router.post("/start/stream")
+async def start_review_stream(
+    request: ReviewRequest,
+    github_token: str = Depends(require_github_token),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
+    accept: Optional[str] = Header(None),
 ):
-    """Publish review suggestions to a GitHub PR"""
-    if not access_token:
-        raise HTTPException(status_code=401, detail="Missing access token")
+    """
+    Same review as /start, streamed as each file finishes.
 
-    payload = verify_jwt(access_token)
-    if not payload:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    Each message is one entry of /start's "review" list, so the UI can render
+    early files while later ones are still with the LLM. Sent as NDJSON by
+    default, or as Server-Sent Events (ending with an `event: done` frame)
+    when the client accepts text/event-stream.
+    """
+    sse = "text/event-stream" in (accept or "")
+
+    async def results():
+        # Created here, not before the response starts, so nothing is left
+        # unawaited if the client disconnects first
+        tasks = [
+            asyncio.create_task(review)
+            for review in _file_reviews(request, github_token, http_client)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if result is None:
+                    continue
+                if sse:
+                    yield b"data: " + orjson.dumps(result) + b"\n\n"
+                else:
+                    yield orjson.dumps(result) + b"\n"
+            if sse:
+                yield b"event: done\ndata: {}\n\n"
+        finally:
+            # Client went away: stop reviews nobody will read. LLM calls that no
+            # other request is waiting on are cancelled too (see llm_cache)
+            for task in tasks:
+                task.cancel()
+
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    return StreamingResponse(results(), media_type=media_type)
 
-    user_id = str(payload["sub"])
-    github_token = sessions.get(user_id, {}).get("github_token")
-    if not github_token:
-        raise HTTPException(status_code=401, detail="No GitHub token found")
 
-    publisher = PRPublisher(github_token)
+@router.post("/publish")
+async def publish_review(
+    request: PRPublishRequest,
+    github_token: str = Depends(require_github_token),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
+):
+    """Publish review suggestions to a GitHub PR"""
+    publisher = PRPublisher(github_token, http_client)
 
     try:
         result = await publisher.publish_review_to_pr(
             owner=request.owner,
             repo=request.repo,
             pull_number=request.pull_number,
-            suggestions=[s.dict() for s in request.suggestions],
+            suggestions=[s.model_dump() for s in request.suggestions],
         )
         return {"ok": True, "review": result}
     except Exception as e:
-        logging.exception(f"Failed to publish review: {e}")
+        logging.exception("Failed to publish review: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/create-review-pr")
 async def create_review_pr(
     request: CreatePRRequest,
-    access_token: Optional[str] = Cookie(None),
+    github_token: str = Depends(require_github_token),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
 ):
     """Create a new PR with review comments (no code changes)"""
-    if not access_token:
-        raise HTTPException(status_code=401, detail="Missing access token")
-
-    payload = verify_jwt(access_token)
-    if not payload:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    user_id = str(payload["sub"])
-    github_token = sessions.get(user_id, {}).get("github_token")
-    if not github_token:
-        raise HTTPException(status_code=401, detail="No GitHub token found")
-
-    creator = PRCreator(github_token)
+    creator = PRCreator(github_token, http_client)
 
     try:
         pr_data = await creator.create_review_pr_with_changes(
@@ -284,38 +405,22 @@ async def create_review_pr(
         )
         return {"ok": True, "pr": pr_data}
     except Exception as e:
-        logging.exception(f"Failed to create review PR: {e}")
+        logging.exception("Failed to create review PR: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/create-pr-with-changes")
 async def create_pr_with_changes(
     request: CreatePRWithChangesRequest,
-    access_token: Optional[str] = Cookie(None),
+    github_token: str = Depends(require_github_token),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
 ):
     """Create a PR with actual code changes from approved suggestions"""
-    if not access_token:
-        raise HTTPException(status_code=401, detail="Missing access token")
-
-    payload = verify_jwt(access_token)
-    if not payload:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    user_id = str(payload["sub"])
-    github_token = sessions.get(user_id, {}).get("github_token")
-    if not github_token:
-        raise HTTPException(status_code=401, detail="No GitHub token found")
-
-    creator = PRCreator(github_token)
+    creator = PRCreator(github_token, http_client)
 
     try:
         approved_changes = [
-            {
-                "file": change.file,
-                "original_content": change.original_content,
-                "modified_content": change.modified_content,
-                "suggestion": change.suggestion,
-            }
+            change.model_dump(include=APPROVED_CHANGE_FIELDS)
             for change in request.approved_changes
         ]
 
@@ -329,29 +434,18 @@ async def create_pr_with_changes(
 
         return {"ok": True, "pr": pr_data}
     except Exception as e:
-        logging.exception(f"Failed to create PR with changes: {e}")
+        logging.exception("Failed to create PR with changes: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/apply-suggestion")
 async def apply_suggestion(
     request: ApplySuggestionRequest,
-    access_token: Optional[str] = Cookie(None),
+    github_token: str = Depends(require_github_token),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
 ):
     """Apply an AI suggestion to a file and return the diff"""
-    if not access_token:
-        raise HTTPException(status_code=401, detail="Missing access token")
-
-    payload = verify_jwt(access_token)
-    if not payload:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    user_id = str(payload["sub"])
-    github_token = sessions.get(user_id, {}).get("github_token")
-    if not github_token:
-        raise HTTPException(status_code=401, detail="No GitHub token found")
-
-    client = GitHubClient(github_token)
+    client = GitHubClient(github_token, http_client)
 
     try:
         # Fetch original file content
@@ -361,8 +455,9 @@ async def apply_suggestion(
             request.file_ref.path,
         )
 
-        # Apply suggestion
-        result = CodeApplier.smart_apply_suggestion(
+        # Apply suggestion (CPU-bound diffing runs in a worker thread)
+        result = await asyncio.to_thread(
+            CodeApplier.smart_apply_suggestion,
             original_code=original_content,
             suggestion=request.suggestion,
             line_start=request.line_start,
@@ -380,5 +475,5 @@ async def apply_suggestion(
             "error": result.get("error"),
         }
     except Exception as e:
-        logging.exception(f"Failed to apply suggestion: {e}")
+        logging.exception("Failed to apply suggestion: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,24 @@
+from typing import Optional
+from fastapi import Cookie, Request
+from app.core.jwt_auth import verify_jwt
+from app.services.session_store import SessionStore
+
+
+async def verified_payload(request: Request, access_token: Optional[str] = Cookie(None)) -> Optional[dict]:
+    """Dependency returning the decoded `access_token` cookie, or None if missing/invalid.
+
+    The result is memoized on `request.state` so the JWT is verified at most
+    once per request, however many dependencies or handlers ask for it.
+    Async because verification is a cache hit or one HMAC; a sync dependency
+    would cost a threadpool hop on every request.
+    """
+    payload = getattr(request.state, "jwt_payload", None)
+    if payload is None and access_token:
+        payload = verify_jwt(access_token)
+        request.state.jwt_payload = payload
+    return payload
+
+
+def get_session_store(request: Request) -> SessionStore:
+    """Dependency returning the session store created in the app lifespan."""
+    return request.app.state.sessions
@@ -0,0 +1,7 @@
+import httpx
+from fastapi import Request
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    """Dependency returning the shared pooled client created in the app lifespan."""
+    return request.app.state.http
@@ -1,25 +1,56 @@
-from datetime import datetime, timedelta, timezone
-from jose import jwt, JWTError
+from threading import Lock
+import time
+from cachetools import TTLCache
+import jwt
 import os
 
 SECRET_KEY = os.getenv("JWT_SECRET", "your-dev-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", 60))
 
+# Resolved once at import so token issue/verify never touch os.environ
+_SECRET_BYTES = SECRET_KEY.encode()
+_EXPIRE_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+# Verified payloads keyed by the raw token string. Entries also honour the
+# token's own `exp`, so a cache hit never outlives the token.
+_verified_tokens = TTLCache(maxsize=10_000, ttl=60)
+_verified_tokens_lock = Lock()  # callers may run in the threadpool too
+
+# Tokens that failed verification, so a client retrying a bad or expired
+# cookie doesn't re-run the signature check every time. Kept apart from
+# _verified_tokens so junk tokens can't evict valid entries.
+_rejected_tokens = TTLCache(maxsize=10_000, ttl=30)
+
 def create_jwt(user_id: str) -> str:
-    # Use UTC timestamp for exp!
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    # exp is a UTC epoch timestamp; time.time() avoids datetime/tz arithmetic
     payload = {
         "sub": str(user_id),
-        "exp": int(expire.timestamp()),
+        "exp": int(time.time()) + _EXPIRE_SECONDS,
     }
-    token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+    token = jwt.encode(payload, _SECRET_BYTES, algorithm=ALGORITHM)
     return token
 
 
 def verify_jwt(token: str) -> dict:
+    with _verified_tokens_lock:
+        payload = _verified_tokens.get(token)
+        rejected = token in _rejected_tokens
+    if rejected:
+        return None
+    if payload is not None:
+        if payload.get("exp", 0) > time.time():
+            return payload
+        with _verified_tokens_lock:
+            _verified_tokens.pop(token, None)
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError:
+        payload = jwt.decode(token, _SECRET_BYTES, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        with _verified_tokens_lock:
+            _rejected_tokens[token] = True
         return None
+
+    with _verified_tokens_lock:
+        _verified_tokens[token] = payload
+    return payload
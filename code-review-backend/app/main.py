@@ -1,13 +1,18 @@
 # app/main.py
 from fastapi import FastAPI
-from collections import defaultdict
+from collections import deque
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
 from fastapi import Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 import logging
 import time
+from uuid import uuid4
+import httpx
+import redis.asyncio as redis
+from cachetools import TTLCache
 
 load_dotenv()  # Loads .env vars early so env vars (e.g. JWT_SECRET) are available to imported modules
 
@@ -42,17 +47,87 @@ from app.api import profile
 from app.api import protected
 from app.api import repositories
 from app.api import reviews
+from app.services import llm_cache
+from app.services.session_store import SessionStore
 # Remove this line: from app.api import create_pr
 
-app = FastAPI(title="AI Code Review API", description="Backend for code review assistant.")
-
 RATE_LIMIT = 30  # requests per minute
-user_requests = defaultdict(list)
+RATE_LIMIT_WINDOW = 60  # seconds
+# In-process limiter, used when REDIS_URL is not set or Redis is failing: one
+# fixed-size deque of timestamps per IP, with idle IPs evicted so memory stays
+# bounded.
+user_requests = TTLCache(maxsize=100_000, ttl=120)
+
+# Optional: share rate-limit state across workers via Redis
+REDIS_URL = os.getenv("REDIS_URL")
+
+# Rolling 60s window per key: drop old entries, count, then record this hit.
+# KEYS[1] = per-client key, ARGV = now_ms, limit, unique member suffix
+RATE_LIMIT_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, ARGV[1] - 60000)
+local n = redis.call('ZCARD', KEYS[1])
+if n >= tonumber(ARGV[2]) then return 0 end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[1] .. ':' .. ARGV[3])
+redis.call('PEXPIRE', KEYS[1], 60000)
+return 1
+"""
 
-# CORS - allow frontend to talk to backend
+def _allow_local(user_ip: str) -> bool:
+    """In-process rolling-window limiter: record the hit and return False if over the limit."""
+    # Monotonic is enough for in-process bookkeeping (Redis needs wall time
+    # because it is shared across workers)
+    now = time.monotonic()
+    cutoff = now - RATE_LIMIT_WINDOW
+    timestamps = user_requests.get(user_ip)
+    if timestamps is None:
+        timestamps = deque(maxlen=RATE_LIMIT)
+    # Re-insert so the TTL only expires IPs that have gone idle
+    user_requests[user_ip] = timestamps
+    # Drop requests older than the window; the deque is oldest-first
+    while timestamps and timestamps[0] <= cutoff:
+        timestamps.popleft()
+    if len(timestamps) >= RATE_LIMIT:
+        return False
+    timestamps.append(now)
+    return True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for all outbound GitHub calls so TCP/TLS connections are reused
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=30, max_connections=100),
+        # GitHub content/PR calls can be slow to respond; fail fast on connect
+        timeout=httpx.Timeout(30.0, connect=10.0),
+    )
+    app.state.redis = redis.from_url(REDIS_URL) if REDIS_URL else None
+    if app.state.redis is not None:
+        # Script object runs EVALSHA and reloads the script if Redis lost it
+        app.state.rate_limit_script = app.state.redis.register_script(RATE_LIMIT_SCRIPT)
+    # GitHub tokens and cached LLM reviews are shared through Redis when it's configured
+    app.state.sessions = SessionStore(app.state.redis, ttl=auth.SESSION_MAX_AGE)
+    llm_cache.use_redis(app.state.redis)
+    yield
+    llm_cache.use_redis(None)
+    await app.state.http.aclose()
+    if app.state.redis is not None:
+        await app.state.redis.aclose()
+
+# orjson serializes the large review/diff payloads much faster than stdlib json
+app = FastAPI(
+    title="AI Code Review API",
+    description="Backend for code review assistant.",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+# CORS - allow frontend to talk to backend. A single literal origin keeps
+# CORSMiddleware on its exact-match path; requests without an Origin header
+# (e.g. the OAuth callback redirect) pass straight through it.
+FRONTEND_ORIGIN = "http://localhost:5173"
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:5173"],  # Only allow frontend origin
+    allow_origins=[FRONTEND_ORIGIN],  # Only allow frontend origin
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"]
@@ -64,25 +139,33 @@ async def root():
     return {"message": "API running"}
 
 @app.middleware("http")
-async def log_requests(request: Request, call_next):
-    logging.info(f"Incoming: {request.method} {request.url}")
+async def observability(request: Request, call_next):
+    """Request logging, rate limiting and error handling in a single middleware layer."""
+    logging.info("Incoming: %s %s", request.method, request.url)
+
+    # Read the ASGI scope tuple directly instead of building request.client
+    client = request.scope.get("client")
+    user_ip = client[0] if client else "unknown"
+    allowed = None
+    if getattr(request.app.state, "redis", None) is not None:
+        try:
+            allowed = await request.app.state.rate_limit_script(
+                keys=[f"rl:{user_ip}"],
+                args=[int(time.time() * 1000), RATE_LIMIT, uuid4().hex],
+            )
+        except (redis.RedisError, OSError) as e:
+            # Fail open to the in-process limiter rather than 500 every route
+            logging.warning("Redis rate limit failed, using in-process limiter: %s", e)
+    if allowed is None:
+        allowed = _allow_local(user_ip)
+    if not allowed:
+        return ORJSONResponse(status_code=429, content={"error": "Rate limit exceeded"})
+
     try:
-        response = await call_next(request)
-        return response
+        return await call_next(request)
     except Exception as e:
-        logging.error(f"Error: {e}")
-        return JSONResponse(status_code=500, content={"error": str(e)})
-
-@app.middleware("http")
-async def rate_limiter(request: Request, call_next):
-    user_ip = request.client.host
-    now = time.time()
-    # Keep only requests in last minute
-    user_requests[user_ip] = [t for t in user_requests[user_ip] if now - t < 60]
-    if len(user_requests[user_ip]) >= RATE_LIMIT:
-        return JSONResponse(status_code=429, content={"error": "Rate limit exceeded"})
-    user_requests[user_ip].append(now)
-    return await call_next(request)
+        logging.error("Error: %s", e)
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 # Include routers
 app.include_router(auth.router)
@@ -1,25 +1,36 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 
 class FileRef(BaseModel):
-    owner: str
-    repo: str
-    path: str
-
-class FileToReview(BaseModel):
+    model_config = ConfigDict(frozen=True)
     owner: str
     repo: str
     path: str
 
 class ReviewRequest(BaseModel):
-    files: List[FileToReview]
+    files: List[FileRef]
+    # Optional base commit/branch; chunks unchanged from it are not re-reviewed
+    base_sha: Optional[str] = None
+
+class PublishSuggestion(BaseModel):
+    file: str
+    comment: str
+    line: Optional[int] = None
+    highlighted_lines: Optional[List[int]] = None
 
 class PRPublishRequest(BaseModel):
     """Request to publish review to GitHub PR with inline comments"""
     owner: str
     repo: str
     pull_number: int
-    suggestions: List[dict]
+    suggestions: List[PublishSuggestion]
+
+class CreatePRRequest(BaseModel):
+    owner: str
+    repo: str
+    branch_name: Optional[str] = None
+    title: Optional[str] = None
+    body: Optional[str] = None
 
 class ApprovedChange(BaseModel):
     file: str
@@ -2,10 +2,15 @@
 Service to apply AI suggestions to code and generate diffs.
 """
 import re
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 import difflib
 import logging
 
+# Suggestion-parsing patterns, compiled once at import
+# "Lines 10-15" or "Line 42"; bold "**...:**" variants are detected per match
+_LINE_RANGE_RE = re.compile(r'Lines\s+(\d+)-(\d+)|Line\s+(\d+)', re.IGNORECASE)
+_NUMBERED_ITEM_RE = re.compile(r'\n\d+\.\s+')
+
 
 class CodeApplier:
     """Apply AI-suggested changes to code"""
@@ -18,14 +23,31 @@ class CodeApplier:
         Returns:
             List of (language, code) tuples
         """
-        # Pattern: ```language\ncode\n```
-        pattern = r'```(\w*)\n(.*?)\n```'
-        matches = re.findall(pattern, suggestion, re.DOTALL)
-        
-        if matches:
-            return [(lang or 'text', code.strip()) for lang, code in matches]
-        
-        return []
+        return list(CodeApplier._iter_code_blocks(suggestion))
+    
+    @staticmethod
+    def _iter_code_blocks(suggestion: str) -> Iterator[Tuple[str, str]]:
+        """Yield (language, code) per fenced block, lazily so callers can stop early."""
+        # Pattern: ```language\ncode\n```, scanned with str.find so an
+        # unclosed fence costs one pass instead of a lazy DOTALL search
+        pos = 0
+        while True:
+            fence = suggestion.find('```', pos)
+            if fence < 0:
+                break
+            newline = suggestion.find('\n', fence + 3)
+            if newline < 0:
+                break
+            lang = suggestion[fence + 3:newline]
+            if not all(c.isalnum() or c == '_' for c in lang):
+                # Not an opening fence (same rule as \w*); try the next backtick
+                pos = fence + 1
+                continue
+            close = suggestion.find('\n```', newline + 1)
+            if close < 0:
+                break
+            yield lang or 'text', suggestion[newline + 1:close].strip()
+            pos = close + 4
     
     @staticmethod
     def extract_line_ranges(suggestion: str) -> List[Tuple[int, int]]:
@@ -35,28 +57,53 @@ class CodeApplier:
         Returns:
             List of (start_line, end_line) tuples
         """
-        ranges = []
+        bold_lines, lines, spans, bold_spans = [], [], [], []
         
-        # Pattern: "Line 42" or "Lines 10-15"
-        patterns = [
-            r'\*\*Line\s+(\d+):\*\*',           # **Line 12:**
-            r'Line\s+(\d+)',                     # Line 42
-            r'Lines\s+(\d+)-(\d+)',              # Lines 10-15
-            r'\*\*Lines\s+(\d+)-(\d+):\*\*',    # **Lines 10-15:**
-        ]
+        # One pass over the text; results keep the priority order callers rely
+        # on: **Line N:**, Line N, Lines N-M, **Lines N-M:**
+        for match in _LINE_RANGE_RE.finditer(suggestion):
+            bold = CodeApplier._is_bold_line_ref(suggestion, match)
+            if match.group(3) is None:  # Range
+                span = (int(match.group(1)), int(match.group(2)))
+                spans.append(span)
+                if bold:
+                    bold_spans.append(span)
+            else:  # Single line
+                line = int(match.group(3))
+                lines.append((line, line))
+                if bold:
+                    bold_lines.append((line, line))
         
-        for pattern in patterns:
-            matches = re.finditer(pattern, suggestion, re.IGNORECASE)
-            for match in matches:
-                if len(match.groups()) == 2:  # Range
-                    start = int(match.group(1))
-                    end = int(match.group(2))
-                    ranges.append((start, end))
-                else:  # Single line
-                    line = int(match.group(1))
-                    ranges.append((line, line))
+        # A bold reference also matches its plain form; keep each range once,
+        # in first-seen order, so the leading entry is unchanged
+        return list(dict.fromkeys(bold_lines + lines + spans + bold_spans))
+    
+    @staticmethod
+    def _first_line_range(suggestion: str) -> Optional[Tuple[int, int]]:
+        """First entry of extract_line_ranges(suggestion), scanning only as far as needed."""
+        first_line = first_span = None
         
-        return ranges
+        for match in _LINE_RANGE_RE.finditer(suggestion):
+            if match.group(3) is None:  # Range
+                if first_span is None:
+                    first_span = (int(match.group(1)), int(match.group(2)))
+            else:  # Single line; a bold one outranks everything
+                line = int(match.group(3))
+                if CodeApplier._is_bold_line_ref(suggestion, match):
+                    return (line, line)
+                if first_line is None:
+                    first_line = (line, line)
+        
+        return first_line or first_span
+    
+    @staticmethod
+    def _is_bold_line_ref(text: str, match: re.Match) -> bool:
+        """Whether a line reference is written as **Line N:** / **Lines N-M:**."""
+        return (
+            match.start() >= 2
+            and text.startswith('**', match.start() - 2)
+            and text.startswith(':**', match.end())
+        )
     
     @staticmethod
     def smart_extract_changes(suggestion: str) -> List[Dict]:
@@ -69,31 +116,31 @@ class CodeApplier:
         changes = []
         
         # Split by numbered items (1., 2., 3., etc.)
-        parts = re.split(r'\n\d+\.\s+', suggestion)
+        parts = _NUMBERED_ITEM_RE.split(suggestion)
         
         for part in parts:
             if not part.strip():
                 continue
             
-            # Extract description (everything before the code block)
-            code_blocks = CodeApplier.extract_code_blocks(part)
-            line_ranges = CodeApplier.extract_line_ranges(part)
+            # Only the first code block and first line range of a part are used
+            code_block = next(CodeApplier._iter_code_blocks(part), None)
+            if code_block is None:
+                continue
+            line_range = CodeApplier._first_line_range(part)
+            if line_range is None:
+                continue
             
-            # Get description (first paragraph before code block)
-            description_match = re.match(r'(.*?)```', part, re.DOTALL)
-            description = description_match.group(1).strip() if description_match else part[:200]
+            # Description: everything before the first code fence
+            description = part[:part.find('```')].strip()
             
             # Create change entry
-            for code_lang, code in code_blocks:
-                for start_line, end_line in line_ranges:
-                    changes.append({
-                        "lines": (start_line, end_line),
-                        "code": code,
-                        "description": description,
-                        "language": code_lang
-                    })
-                    break  # Only use first line range per code block
-                break  # Only use first code block per part
+            code_lang, code = code_block
+            changes.append({
+                "lines": line_range,
+                "code": code,
+                "description": description,
+                "language": code_lang
+            })
         
         return changes
     
@@ -106,20 +153,107 @@ class CodeApplier:
     ) -> str:
         """
         Replace lines [line_start, line_end] with replacement text.
+
+        Slices the original string around the replaced lines rather than
+        splitting and re-joining every line of the file.
         """
-        lines = original_code.split('\n')
+        line_count = original_code.count('\n') + 1
         
         # Convert to 0-indexed
-        start_idx = max(0, line_start - 1)
-        end_idx = min(len(lines), line_end)
+        start_idx = min(max(0, line_start - 1), line_count)
+        end_idx = min(line_count, line_end)
+        if end_idx < 0:
+            # A negative end indexes from the end of the file, like the
+            # lines[end_idx:] slice this replaced
+            end_idx = max(0, line_count + end_idx)
         
-        # Split replacement into lines
-        replacement_lines = replacement.split('\n')
+        if start_idx == line_count:
+            start_offset = len(original_code)
+            head = original_code + '\n'
+        else:
+            start_offset = CodeApplier._line_offset(original_code, start_idx)
+            head = original_code[:start_offset]
         
-        # Apply replacement
-        new_lines = lines[:start_idx] + replacement_lines + lines[end_idx:]
+        if end_idx < line_count:
+            # Usually end >= start, so continue from the head's offset
+            if end_idx >= start_idx:
+                end_offset = CodeApplier._line_offset(
+                    original_code, end_idx - start_idx, start_offset
+                )
+            else:
+                end_offset = CodeApplier._line_offset(original_code, end_idx)
+            tail = '\n' + original_code[end_offset:]
+        else:
+            tail = ''
         
-        return '\n'.join(new_lines)
+        return head + replacement + tail
+    
+    @staticmethod
+    def _line_offset(text: str, index: int, pos: int = 0) -> int:
+        """Offset of the line `index` lines past the one starting at `pos` (must exist)."""
+        for _ in range(index):
+            pos = text.find('\n', pos) + 1
+        return pos
+    
+    @staticmethod
+    def apply_line_replacements(
+        original_code: str,
+        replacements: List[Tuple[int, int, str]]
+    ) -> Optional[str]:
+        """
+        Apply several (line_start, line_end, replacement) edits in one pass.
+
+        Line numbers refer to original_code. Returns None unless every range
+        lies within the file and no two overlap; callers then fall back to
+        apply_line_replacement one change at a time.
+        """
+        line_count = original_code.count('\n') + 1
+        edits = sorted(replacements, key=lambda edit: edit[0])
+        
+        prev_end = 0
+        for line_start, line_end, _ in edits:
+            if not prev_end < line_start <= line_end <= line_count:
+                return None
+            prev_end = line_end
+        
+        pieces = []
+        cursor = 0  # end of the original text already copied
+        pos, line_idx = 0, 0  # offset where 0-indexed line `line_idx` starts
+        for line_start, line_end, replacement in edits:
+            start = CodeApplier._line_offset(original_code, line_start - 1 - line_idx, pos)
+            pieces.append(original_code[cursor:start])
+            pieces.append(replacement)
+            if line_end < line_count:
+                pos = CodeApplier._line_offset(original_code, line_end - line_start + 1, start)
+                line_idx = line_end
+                pieces.append('\n')
+                cursor = pos
+            else:
+                cursor = len(original_code)
+        pieces.append(original_code[cursor:])
+        
+        return ''.join(pieces)
+    
+    @staticmethod
+    def _split_applicable(changes: List[Dict], line_count: int) -> Tuple[List[Dict], List[str]]:
+        """
+        Split changes into those apply_line_replacements can take and reasons for the rest.
+
+        Changes are considered in order; one is skipped if its lines fall outside
+        the file or overlap a change already accepted.
+        """
+        accepted, skipped = [], []
+        
+        for change in changes:
+            start, end = change["lines"]
+            if not 1 <= start <= end <= line_count:
+                skipped.append(f"lines {start}-{end} are outside the file (1-{line_count})")
+            elif any(start <= e and s <= end for s, e in (c["lines"] for c in accepted)):
+                skipped.append(f"lines {start}-{end} overlap another change")
+            else:
+                accepted.append(change)
+        
+        return accepted, skipped
     
     @staticmethod
     def generate_diff(original: str, modified: str, filename: str = "file", context_lines: int = 3) -> str:
@@ -135,6 +269,10 @@ class CodeApplier:
         Returns:
             Unified diff string with context
         """
+        # Identical inputs have an empty diff; skip splitting and difflib
+        if original == modified:
+            return ''
+        
         original_lines = original.splitlines(keepends=True)
         modified_lines = modified.splitlines(keepends=True)
         
@@ -170,8 +308,8 @@ class CodeApplier:
                 "modified_code": str,
                 "diff": str,
                 "applied": bool,
-                "changes": List[Dict],  # Details of all changes
-                "error": Optional[str]
+                "changes": List[Dict],  # Details of the changes applied
+                "error": Optional[str]  # Also lists skipped changes, if any
             }
         """
         try:
@@ -199,26 +337,14 @@ class CodeApplier:
                         "error": "No code block found in suggestion"
                     }
             
-            # Apply all changes sequentially
-            modified_code = original_code
-            all_changes_applied = []
-            
-            for change in changes:
-                start, end = change["lines"]
-                code = change["code"]
-                
-                try:
-                    modified_code = CodeApplier.apply_line_replacement(
-                        modified_code,
-                        start,
-                        end,
-                        code
-                    )
-                    all_changes_applied.append(change)
-                    logging.info(f"Applied change at lines {start}-{end}")
-                except Exception as e:
-                    logging.error(f"Failed to apply change at lines {start}-{end}: {e}")
-                    continue
+            # Every change's line numbers refer to the original code. Changes
+            # outside the file or overlapping an earlier change are skipped and
+            # reported; the rest are applied together in one pass.
+            all_changes_applied, skipped = CodeApplier._split_applicable(
+                changes, original_code.count('\n') + 1
+            )
+            for reason in skipped:
+                logging.warning(f"Skipped change: {reason}")
             
             if not all_changes_applied:
                 return {
@@ -226,9 +352,15 @@ class CodeApplier:
                     "diff": "",
                     "applied": False,
                     "changes": [],
-                    "error": "Failed to apply any changes"
+                    "error": "Failed to apply any changes: " + "; ".join(skipped)
                 }
             
+            modified_code = CodeApplier.apply_line_replacements(
+                original_code,
+                [(*change["lines"], change["code"]) for change in all_changes_applied]
+            )
+            logging.info(f"Applied {len(all_changes_applied)} change(s) in one pass")
+            
             # Generate diff
             diff = CodeApplier.generate_diff(
                 original_code, 
@@ -242,7 +374,7 @@ class CodeApplier:
                 "diff": diff,
                 "applied": True,
                 "changes": all_changes_applied,
-                "error": None
+                "error": ("Skipped " + "; ".join(skipped)) if skipped else None
             }
             
         except Exception as e:
@@ -1,13 +1,25 @@
 import httpx
 import base64
-from typing import List, Dict
+from typing import List, Dict, Optional
+from urllib.parse import urlencode
+from cachetools import LRUCache
+
+# Contents API URL -> (ETag, decoded file). Revalidated with If-None-Match on
+# every read, so access is still checked per token and 304s don't count
+# against the GitHub rate limit. Bounded by total characters held.
+FILE_CACHE_MAX_CHARS = 64 * 1024 * 1024
+_file_cache = LRUCache(maxsize=FILE_CACHE_MAX_CHARS, getsizeof=lambda entry: len(entry[1]) or 1)
 
 class GitHubClient:
     """
     Encapsulates interaction with GitHub API using a user's access token.
+
+    Requests go through the shared, pooled `httpx.AsyncClient` owned by the
+    app lifespan instead of opening a new connection per call.
     """
-    def __init__(self, access_token: str):
+    def __init__(self, access_token: str, http_client: httpx.AsyncClient):
         self.access_token = access_token
+        self.http_client = http_client
         self.base_headers = {
             "Authorization": f"token {self.access_token}",
             "Accept": "application/vnd.github.v3+json"
@@ -17,47 +29,57 @@ class GitHubClient:
         """
         Lists repositories for the authenticated user.
         """
-        async with httpx.AsyncClient() as client:
-            resp = await client.get("https://api.github.com/user/repos", headers=self.base_headers)
-            resp.raise_for_status()
-            return resp.json()
+        resp = await self.http_client.get("https://api.github.com/user/repos", headers=self.base_headers)
+        resp.raise_for_status()
+        return resp.json()
 
     async def get_repo_contents(self, owner: str, repo: str, path: str="") -> List[Dict]:
         """
         Gets contents of a repo directory or file list.
         """
         url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}"
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url, headers=self.base_headers)
-            resp.raise_for_status()
-            return resp.json()
+        resp = await self.http_client.get(url, headers=self.base_headers)
+        resp.raise_for_status()
+        return resp.json()
 
-    async def get_file_content(self, owner: str, repo: str, path: str) -> str:
+    async def get_file_content(self, owner: str, repo: str, path: str, ref: Optional[str] = None) -> str:
         """Fetch raw file content for a file in a repository.
 
         Uses the GitHub Contents API and decodes base64-encoded files.
-        Returns the file as a UTF-8 string.
+        `ref` selects a commit, branch or tag (default: the repo's default branch).
+        Returns the file as a UTF-8 string, served from the local cache when
+        GitHub answers 304 Not Modified.
         Raises ValueError on failure.
         """
         url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}"
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            try:
-                resp = await client.get(url, headers=self.base_headers)
-                resp.raise_for_status()
-                data = resp.json()
-                
-                if "content" not in data:
-                    raise ValueError(f"No content found for {path}")
-                
-                # File responses include 'content' (base64) and 'encoding'
-                if isinstance(data, dict) and data.get("encoding") == "base64" and "content" in data:
-                    raw = base64.b64decode(data["content"]).decode("utf-8", errors="replace")
-                    return raw
-                # Fallback: if the API returned text directly, coerce to string
-                return str(data)
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code == 404:
-                    raise ValueError(f"File not found: {path}")
-                raise ValueError(f"GitHub API error: {e.response.status_code}")
-            except Exception as e:
-                raise ValueError(f"Failed to fetch file content: {str(e)}")
+        if ref:
+            url += "?" + urlencode({"ref": ref})
+        cached = _file_cache.get(url)
+        headers = self.base_headers
+        if cached is not None:
+            headers = {**self.base_headers, "If-None-Match": cached[0]}
+        try:
+            resp = await self.http_client.get(url, headers=headers)
+            if resp.status_code == 304 and cached is not None:
+                return cached[1]
+            resp.raise_for_status()
+            data = resp.json()
+
+            if "content" not in data:
+                raise ValueError(f"No content found for {path}")
+
+            # File responses include 'content' (base64) and 'encoding'
+            if isinstance(data, dict) and data.get("encoding") == "base64" and "content" in data:
+                raw = base64.b64decode(data["content"]).decode("utf-8", errors="replace")
+                etag = resp.headers.get("ETag")
+                if etag and len(raw) <= FILE_CACHE_MAX_CHARS:
+                    _file_cache[url] = (etag, raw)
+                return raw
+            # Fallback: if the API returned text directly, coerce to string
+            return str(data)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                raise ValueError(f"File not found: {path}")
+            raise ValueError(f"GitHub API error: {e.response.status_code}")
+        except Exception as e:
+            raise ValueError(f"Failed to fetch file content: {str(e)}")
@@ -0,0 +1,122 @@
+"""
+Content-addressed cache for LLM chunk reviews.
+
+Identical chunks (re-reviews, rebases, overlapping PRs) skip the LLM call.
+Entries live in an in-process TTL cache, and also in Redis when REDIS_URL is
+set so cached reviews are shared across workers. Concurrent requests for the
+same key share a single in-flight LLM call.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Optional
+
+import redis.asyncio as redis
+from cachetools import TTLCache
+
+from app.services.llm_service import PROMPT_VERSION, review_code_chunk_with_context
+
+CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 24 * 3600))
+
+_local_cache = TTLCache(maxsize=10_000, ttl=CACHE_TTL_SECONDS)
+
+# The app's shared Redis client (REDIS_URL), set by the lifespan via use_redis
+_redis: Optional[redis.Redis] = None
+
+# Cache key -> task currently producing that review, and how many callers
+# are awaiting it
+_inflight: Dict[str, asyncio.Task] = {}
+_waiters: Dict[str, int] = {}
+
+
+def use_redis(client: Optional[redis.Redis]) -> None:
+    """Share cached reviews through `client`; the caller owns and closes it."""
+    global _redis
+    _redis = client
+
+
+def review_cache_key(chunk: str, language: str, start_line: int, file_path: str) -> str:
+    """Digest of everything that shapes the review prompt for a chunk."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in (str(PROMPT_VERSION), language, file_path, str(start_line), chunk):
+        h.update(part.encode())
+        h.update(b"\0")
+    return "llm-review:" + h.hexdigest()
+
+
+async def cached_review(
+    chunk: str,
+    language: str,
+    start_line: int,
+    file_path: str,
+) -> dict:
+    """`review_code_chunk_with_context`, memoized on the chunk's prompt inputs.
+
+    Only successful reviews are cached; LLM errors propagate and are retried
+    on the next call.
+    """
+    key = review_cache_key(chunk, language, start_line, file_path)
+
+    review = _local_cache.get(key)
+    if review is not None:
+        return review
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(
+            _load_or_review(
+                key,
+                chunk=chunk,
+                language=language,
+                start_line=start_line,
+                file_path=file_path,
+            )
+        )
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _forget(key, done))
+
+    # Shielded so one caller being cancelled doesn't fail the others; once the
+    # last caller is gone the LLM call is cancelled rather than left running
+    _waiters[key] = _waiters.get(key, 0) + 1
+    try:
+        return await asyncio.shield(task)
+    finally:
+        _waiters[key] -= 1
+        if not _waiters[key]:
+            del _waiters[key]
+            if not task.done():
+                _forget(key, task)
+                task.cancel()
+
+
+def _forget(key: str, task: asyncio.Task) -> None:
+    """Drop `task` from the in-flight table, unless a newer task replaced it."""
+    if _inflight.get(key) is task:
+        del _inflight[key]
+
+
+async def _load_or_review(key: str, **review_kwargs) -> dict:
+    """Fetch a review from Redis, or run the LLM and store the result."""
+    if _redis is not None:
+        try:
+            raw = await _redis.get(key)
+        except Exception as e:
+            logging.warning("LLM cache read failed: %s", e)
+            raw = None
+        if raw is not None:
+            review = json.loads(raw)
+            _local_cache[key] = review
+            return review
+
+    review = await review_code_chunk_with_context(**review_kwargs)
+    _local_cache[key] = review
+
+    if _redis is not None:
+        try:
+            await _redis.set(key, json.dumps(review), ex=CACHE_TTL_SECONDS)
+        except Exception as e:
+            logging.warning("LLM cache write failed: %s", e)
+
+    return review
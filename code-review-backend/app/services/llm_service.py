@@ -2,12 +2,17 @@ import logging
 import os
 import re
 import difflib
+from functools import lru_cache
 from typing import List, Optional
 
 from openai import AsyncOpenAI
 
 client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+# Bump whenever the review prompt or model settings change; it is part of the
+# review cache key (see llm_cache) so stale cached reviews are not reused.
+PROMPT_VERSION = 5
+
 # Configure detailed logging (only once at module import)
 logging.basicConfig(
     level=logging.INFO,
@@ -15,6 +20,27 @@ logging.basicConfig(
 )
 
 
+# Response-parsing patterns, compiled once at import
+_LINE_REF_RE = re.compile(r"Line(?:s)?[^\n]*", re.IGNORECASE)
+# A range "12-15" or a standalone number "12", in one scan
+_LINE_RANGE_OR_NUMBER_RE = re.compile(r"(\d+)\s*-\s*(\d+)|\b(\d+)\b")
+_SEVERITY_HIGH_RE = re.compile(r"Severity:\s*HIGH", re.IGNORECASE)
+_SEVERITY_MEDIUM_RE = re.compile(r"Severity:\s*MEDIUM", re.IGNORECASE)
+_SEVERITY_LOW_RE = re.compile(r"Severity:\s*LOW", re.IGNORECASE)
+_FENCED_CODE_RE = re.compile(r"```[a-zA-Z0-9_+\-]*\n(.*?)```", re.DOTALL)
+# More robust regex that tolerates extra text between sections
+_ISSUE_BLOCK_RE = re.compile(
+    r"Code:\s*```[a-zA-Z0-9_+\-]*\n(.*?)```"
+    r"[\s\S]*?Issue:\s*(.*?)\n+Fix:\s*(.*?)(?=(?:\n+Code:|$))",
+    re.DOTALL | re.IGNORECASE,
+)
+
+
+def _is_word_char(char: str) -> bool:
+    """True for characters regex \\w matches: letters, digits and underscore."""
+    return char.isalnum() or char == "_"
+
+
 def extract_line_numbers(content: str, base_line: int = 0) -> Optional[List[int]]:
     """
     Extract line numbers from LLM response.
@@ -32,23 +58,29 @@ def extract_line_numbers(content: str, base_line: int = 0) -> Optional[List[int]
     line_numbers: set[int] = set()
 
     # Capture any "Line..." line and parse numbers from it
-    for match in re.finditer(r"Line(?:s)?[^\n]*", content, re.IGNORECASE):
+    for match in _LINE_REF_RE.finditer(content):
         segment = match.group(0)
 
         # Normalize Unicode dashes to regular '-'
         segment = segment.replace("–", "-").replace("—", "-")
 
-        # First, handle ranges: 12-15
-        for rng in re.finditer(r"(\d+)\s*-\s*(\d+)", segment):
-            start = int(rng.group(1))
-            end = int(rng.group(2))
-            for n in range(start, end + 1):
-                line_numbers.add(base_line + n)
+        for ref in _LINE_RANGE_OR_NUMBER_RE.finditer(segment):
+            # Individual numbers: 12, 30, etc.
+            if ref.group(3) is not None:
+                line_numbers.add(base_line + int(ref.group(3)))
+                continue
 
-        # Then individual numbers: 12, 30, etc.
-        for single in re.finditer(r"\b(\d+)\b", segment):
-            n = int(single.group(1))
-            line_numbers.add(base_line + n)
+            # Ranges: 12-15
+            start = int(ref.group(1))
+            end = int(ref.group(2))
+            line_numbers.update(range(base_line + start, base_line + end + 1))
+
+            # Endpoints also count as individual numbers when they stand alone
+            # as words, which matters for reversed ranges like 15-12
+            if ref.start() == 0 or not _is_word_char(segment[ref.start() - 1]):
+                line_numbers.add(base_line + start)
+            if ref.end() == len(segment) or not _is_word_char(segment[ref.end()]):
+                line_numbers.add(base_line + end)
 
     if not line_numbers:
         return None
@@ -56,11 +88,19 @@ def extract_line_numbers(content: str, base_line: int = 0) -> Optional[List[int]
     return sorted(line_numbers)
 
 
-def parse_individual_issues(llm_response: str, original_code: str, file_path: str) -> list:
+def parse_individual_issues(
+    llm_response: str,
+    original_code: str,
+    file_path: str,
+    orig_lines: Optional[List[str]] = None,
+) -> list:
     """
     Parse LLM response and generate individual issues with proper diffs including context.
     Each issue contains: comment, diff, highlighted_lines, severity, has_code_block.
 
+    Callers parsing several responses for the same file can pass the file's
+    pre-split `orig_lines` to avoid re-splitting `original_code` each time.
+
     Expected LLM format for each issue:
 
     Code:
@@ -79,16 +119,10 @@ def parse_individual_issues(llm_response: str, original_code: str, file_path: st
     ```
     """
     issues: List[dict] = []
-    orig_lines = original_code.splitlines()
-
-    # More robust regex that tolerates extra text between sections
-    pattern = re.compile(
-        r"Code:\s*```[a-zA-Z0-9_+\-]*\n(.*?)```"
-        r"[\s\S]*?Issue:\s*(.*?)\n+Fix:\s*(.*?)(?=(?:\n+Code:|$))",
-        re.DOTALL | re.IGNORECASE,
-    )
+    if orig_lines is None:
+        orig_lines = original_code.splitlines()
 
-    matches = list(pattern.finditer(llm_response))
+    matches = list(_ISSUE_BLOCK_RE.finditer(llm_response))
     logging.info(f"parse_individual_issues: found {len(matches)} Code/Issue/Fix blocks")
 
     for match in matches:
@@ -99,11 +133,11 @@ def parse_individual_issues(llm_response: str, original_code: str, file_path: st
 
         # --- Severity -------------------------------------------------------
         severity = "MEDIUM"
-        if re.search(r"Severity:\s*HIGH", issue_section, re.IGNORECASE):
+        if _SEVERITY_HIGH_RE.search(issue_section):
             severity = "HIGH"
-        elif re.search(r"Severity:\s*MEDIUM", issue_section, re.IGNORECASE):
+        elif _SEVERITY_MEDIUM_RE.search(issue_section):
             severity = "MEDIUM"
-        elif re.search(r"Severity:\s*LOW", issue_section, re.IGNORECASE):
+        elif _SEVERITY_LOW_RE.search(issue_section):
             severity = "LOW"
 
         # --- Line numbers: first try explicit "Line(s)" info ----------------
@@ -135,9 +169,7 @@ def parse_individual_issues(llm_response: str, original_code: str, file_path: st
 
         # --- Extract the actual fixed code from Fix section -----------------
         fixed_code = ""
-        code_blocks = re.findall(
-            r"```[a-zA-Z0-9_+\-]*\n(.*?)```", fix_section, re.DOTALL
-        )
+        code_blocks = _FENCED_CODE_RE.findall(fix_section)
         if code_blocks:
             # Use the last code block as the replacement snippet
             fixed_code = code_blocks[-1].strip("\n")
@@ -176,13 +208,49 @@ def parse_individual_issues(llm_response: str, original_code: str, file_path: st
     return issues
 
 
+@lru_cache(maxsize=None)
+def _review_instructions(language: str) -> str:
+    """
+    Review instructions and output format for `language`.
+
+    This is the whole system message: it holds no per-file or per-chunk
+    text, so it is built once per language and is identical across calls.
+    Only the numbered chunk is sent for review; the rest of the file is not
+    included as context.
+    """
+    # Build prompt WITHOUT triple-quoted f-strings (to avoid EOF issues)
+    return (
+        f"You are a senior {language} code reviewer.\n\n"
+        "Your job is to:\n"
+        "- Find only MEDIUM or HIGH severity issues (ignore LOW severity / nitpicks).\n"
+        "- Propose **small, targeted line edits**, NOT full rewrites of the whole snippet.\n\n"
+        "For each issue you find, STRICTLY use this format:\n\n"
+        "Code:\n"
+        f"```{language}\n"
+        "<the smallest relevant code snippet copied exactly from the original code (WITHOUT the line number prefixes)>\n"
+        "```\n"
+        "Issue:\n"
+        "Severity: <HIGH | MEDIUM>\n"
+        "Line(s): <comma-separated line numbers from the numbered chunk>\n"
+        "Description: <clear, simple explanation of the issue>\n\n"
+        "Fix:\n"
+        "<short explanation of the fix>\n"
+        f"```{language}\n"
+        "<fixed version of the same snippet>\n"
+        "```\n\n"
+        "Rules:\n"
+        "- Always include both a `Severity:` line and a `Line(s):` line under the Issue section.\n"
+        "- Reuse the exact line numbers from the numbered code block (these map directly to the original file).\n"
+        "- Prefer changing only the problematic lines instead of rewriting large sections.\n"
+        "- If you do not see any MEDIUM or HIGH severity issues, reply exactly with: No issues found.\n\n"
+    )
+
+
 async def review_code_chunk_with_context(
     chunk: str,
     language: str,
     start_line: int,
     file_path: str,
-    project_context: str,
-    full_file_content: str,
 ) -> dict:
     """Review code with intelligent severity filtering and context awareness.
 
@@ -191,6 +259,8 @@ async def review_code_chunk_with_context(
       - Asks the LLM to reference those line numbers
       - Encourages *small, targeted line edits* instead of full rewrites
         (following the “surgical edits” idea from the blog post)
+      - Sends the static review instructions as the system message and
+        only the numbered chunk in the user message
     """
 
     # Determine if the file is a test file by common patterns
@@ -222,40 +292,23 @@ async def review_code_chunk_with_context(
         for lineno, code_line in enumerate(chunk_lines, start=start_line)
     )
 
-    # Build prompt WITHOUT triple-quoted f-strings (to avoid EOF issues)
-    prompt = (
-        f"You are a senior {language} code reviewer. You are analyzing code from file: {file_path}.\n\n"
-        "The code below is shown with its ORIGINAL line numbers on the left:\n\n"
+    user_prompt = (
+        f"File: {file_path}\n\n"
+        "Review this chunk. It is shown with its ORIGINAL line numbers on the left:\n\n"
         f"```{language}\n"
         f"{numbered_chunk}\n"
-        "```\n\n"
-        "Your job is to:\n"
-        "- Find only MEDIUM or HIGH severity issues (ignore LOW severity / nitpicks).\n"
-        "- Propose **small, targeted line edits**, NOT full rewrites of the whole snippet.\n\n"
-        "For each issue you find, STRICTLY use this format:\n\n"
-        "Code:\n"
-        f"```{language}\n"
-        "<the smallest relevant code snippet copied exactly from the original code (WITHOUT the line number prefixes)>\n"
         "```\n"
-        "Issue:\n"
-        "Severity: <HIGH | MEDIUM>\n"
-        "Line(s): <comma-separated line numbers from the numbered code above>\n"
-        "Description: <clear, simple explanation of the issue>\n\n"
-        "Fix:\n"
-        "<short explanation of the fix>\n"
-        f"```{language}\n"
-        "<fixed version of the same snippet>\n"
-        "```\n\n"
-        "Rules:\n"
-        "- Always include both a `Severity:` line and a `Line(s):` line under the Issue section.\n"
-        "- Reuse the exact line numbers from the numbered code block (these map directly to the original file).\n"
-        "- Prefer changing only the problematic lines instead of rewriting large sections.\n"
-        "- If you do not see any MEDIUM or HIGH severity issues, reply exactly with: No issues found.\n"
     )
 
     resp = await client.chat.completions.create(
         model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
+        messages=[
+            {
+                "role": "system",
+                "content": _review_instructions(language),
+            },
+            {"role": "user", "content": user_prompt},
+        ],
         max_tokens=1500,
         temperature=0.1,
     )
@@ -297,9 +350,9 @@ async def review_code_chunk_with_context(
 
     # Determine highest severity mentioned in the chunk
     severity: Optional[str] = None
-    if re.search(r"Severity:\s*HIGH", content, re.IGNORECASE):
+    if _SEVERITY_HIGH_RE.search(content):
         severity = "HIGH"
-    elif re.search(r"Severity:\s*MEDIUM", content, re.IGNORECASE):
+    elif _SEVERITY_MEDIUM_RE.search(content):
         severity = "MEDIUM"
 
     # For test files, be less strict about severity (keep security-ish issues)
@@ -11,8 +11,9 @@ DEFAULT_TIMEOUT = float(os.getenv("GITHUB_API_TIMEOUT", "30.0"))
 class PRCreator:
     """Creates GitHub Pull Requests with actual code changes"""
     
-    def __init__(self, github_token: str) -> None:
+    def __init__(self, github_token: str, http_client: httpx.AsyncClient) -> None:
         self.github_token: str = github_token
+        self.http_client: httpx.AsyncClient = http_client
         self.base_headers: Dict[str, str] = {
             "Authorization": f"token {github_token}",
             "Accept": "application/vnd.github.v3+json"
@@ -21,64 +22,59 @@ class PRCreator:
     async def _get_default_branch(self, owner: str, repo: str) -> str:
         """Get the default branch of the repository"""
         url = f"https://api.github.com/repos/{owner}/{repo}"
-        async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as client:
-            response = await client.get(url, headers=self.base_headers)
-            response.raise_for_status()
-            repo_info = response.json()
-            return repo_info.get('default_branch', 'main')
+        response = await self.http_client.get(url, headers=self.base_headers, timeout=DEFAULT_TIMEOUT)
+        response.raise_for_status()
+        repo_info = response.json()
+        return repo_info.get('default_branch', 'main')
     
     async def _get_latest_commit_sha(self, owner: str, repo: str, branch: str) -> str:
         """Get the latest commit SHA from a branch"""
         url = f"https://api.github.com/repos/{owner}/{repo}/git/refs/heads/{branch}"
-        async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as client:
-            response = await client.get(url, headers=self.base_headers)
-            response.raise_for_status()
-            ref_info = response.json()
-            return ref_info['object']['sha']
+        response = await self.http_client.get(url, headers=self.base_headers, timeout=DEFAULT_TIMEOUT)
+        response.raise_for_status()
+        ref_info = response.json()
+        return ref_info['object']['sha']
     
     async def _get_file_sha(self, owner: str, repo: str, branch: str, path: str) -> Optional[str]:
         """Get the SHA of a file in a specific branch (needed for updates)"""
         url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}?ref={branch}"
-        async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as client:
-            try:
-                response = await client.get(url, headers=self.base_headers)
-                response.raise_for_status()
-                data = response.json()
-                return data.get('sha')
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code == 404:
-                    return None  # File doesn't exist
-                raise
+        try:
+            response = await self.http_client.get(url, headers=self.base_headers, timeout=DEFAULT_TIMEOUT)
+            response.raise_for_status()
+            data = response.json()
+            return data.get('sha')
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return None  # File doesn't exist
+            raise
     
     async def _create_branch(self, owner: str, repo: str, branch_name: str, sha: str) -> bool:
         """Create a new branch from a commit SHA"""
         check_url = f"https://api.github.com/repos/{owner}/{repo}/git/refs/heads/{branch_name}"
-        async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as client:
-            try:
-                check_response = await client.get(check_url, headers=self.base_headers)
-                if check_response.status_code == 200:
-                    logging.info(f"Branch {branch_name} already exists")
-                    return True
-            except httpx.HTTPStatusError:
-                pass
+        try:
+            check_response = await self.http_client.get(check_url, headers=self.base_headers, timeout=DEFAULT_TIMEOUT)
+            if check_response.status_code == 200:
+                logging.info(f"Branch {branch_name} already exists")
+                return True
+        except httpx.HTTPStatusError:
+            pass
         
         url = f"https://api.github.com/repos/{owner}/{repo}/git/refs"
         payload = {
             "ref": f"refs/heads/{branch_name}",
             "sha": sha
         }
-        async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as client:
-            try:
-                response = await client.post(url, json=payload, headers=self.base_headers)
-                response.raise_for_status()
-                logging.info(f"Created branch {branch_name} from {sha}")
+        try:
+            response = await self.http_client.post(url, json=payload, headers=self.base_headers, timeout=DEFAULT_TIMEOUT)
+            response.raise_for_status()
+            logging.info(f"Created branch {branch_name} from {sha}")
+            return True
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 422:
+                logging.warning(f"Branch {branch_name} already exists (422)")
                 return True
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code == 422:
-                    logging.warning(f"Branch {branch_name} already exists (422)")
-                    return True
-                logging.error(f"Failed to create branch: {e.response.text}")
-                raise
+            logging.error(f"Failed to create branch: {e.response.text}")
+            raise
 
     async def _update_file(
         self,
@@ -110,10 +106,9 @@ class PRCreator:
         if file_sha:
             payload["sha"] = file_sha  # Required for updates
         
-        async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as client:
-            response = await client.put(url, json=payload, headers=self.base_headers)
-            response.raise_for_status()
-            return response.json()
+        response = await self.http_client.put(url, json=payload, headers=self.base_headers, timeout=DEFAULT_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
     
     async def create_review_pr_with_changes(
         self,
@@ -195,12 +190,11 @@ class PRCreator:
                 "draft": False
             }
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(url, json=payload, headers=self.base_headers)
-                response.raise_for_status()
-                pr_data = response.json()
-                logging.info(f"Created PR #{pr_data['number']}: {pr_data['html_url']}")
-                return pr_data
+            response = await self.http_client.post(url, json=payload, headers=self.base_headers, timeout=DEFAULT_TIMEOUT)
+            response.raise_for_status()
+            pr_data = response.json()
+            logging.info(f"Created PR #{pr_data['number']}: {pr_data['html_url']}")
+            return pr_data
                 
         except httpx.HTTPStatusError as e:
             error_text = e.response.text
@@ -1,12 +1,19 @@
 import httpx
+from itertools import islice
 from typing import List, Optional
 import logging
+import re
+
+# Diff lines that exist in the new file: additions (but not the '+++'
+# header) and unchanged context lines
+_NEW_FILE_LINE = re.compile(r'^(?:\+(?!\+\+)| )', re.MULTILINE)
 
 class PRPublisher:
     """Posts code review suggestions to GitHub PRs"""
     
-    def __init__(self, github_token: str):
+    def __init__(self, github_token: str, http_client: httpx.AsyncClient):
         self.github_token = github_token
+        self.http_client = http_client
         self.base_headers = {
             "Authorization": f"token {github_token}",
             "Accept": "application/vnd.github.v3+json"
@@ -18,10 +25,9 @@ class PRPublisher:
         This is needed to map line numbers to diff positions for inline comments.
         """
         url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{pull_number}/files"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=self.base_headers)
-            response.raise_for_status()
-            return response.json()
+        response = await self.http_client.get(url, headers=self.base_headers)
+        response.raise_for_status()
+        return response.json()
     
     def _find_diff_position(self, patch: str, line_number: int) -> Optional[int]:
         """
@@ -36,25 +42,16 @@ class PRPublisher:
         if not patch:
             return None
         
-        lines = patch.split('\n')
-        current_line = 0
-        diff_position = 0
+        if line_number < 1:
+            return None
         
-        for line in lines:
-            diff_position += 1
-            
-            # Lines starting with '+' are additions (new lines)
-            if line.startswith('+') and not line.startswith('+++'):
-                current_line += 1
-                if current_line == line_number:
-                    return diff_position
-            # Lines starting with ' ' are context lines (unchanged)
-            elif line.startswith(' '):
-                current_line += 1
-                if current_line == line_number:
-                    return diff_position
+        # Jump straight to the line_number-th new-file line; the regex scan
+        # runs in C instead of branching on every diff line in Python
+        match = next(islice(_NEW_FILE_LINE.finditer(patch), line_number - 1, None), None)
+        if match is None:
+            return None
         
-        return None
+        return patch.count('\n', 0, match.start()) + 1
     
     async def publish_review_to_pr(
         self,
@@ -142,11 +139,10 @@ class PRPublisher:
         }
         
         # Post review with inline comments
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url,
-                json=payload,
-                headers=self.base_headers
-            )
-            response.raise_for_status()
-            return response.json()
\ No newline at end of file
+        response = await self.http_client.post(
+            url,
+            json=payload,
+            headers=self.base_headers
+        )
+        response.raise_for_status()
+        return response.json()
\ No newline at end of file
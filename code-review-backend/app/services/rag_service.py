@@ -1,5 +1,19 @@
 # rag_service.py
 # Chunking service for different programming languages
+import hashlib
+from threading import Lock
+from typing import Callable, List, Tuple
+from cachetools import LRUCache
+
+# Recent chunking results keyed by (chunker, content digest), so re-reviews of
+# unchanged files skip re-chunking. Bounded by total chunk characters, not
+# entry count, since one entry holds a whole file's chunks.
+CHUNK_CACHE_MAX_CHARS = 32 * 1024 * 1024
+_chunk_cache = LRUCache(
+    maxsize=CHUNK_CACHE_MAX_CHARS,
+    getsizeof=lambda chunks: sum(len(chunk) for chunk, _ in chunks) or 1,
+)
+_chunk_cache_lock = Lock()  # large files are chunked in worker threads
 
 def chunk_java_file(code: str):
     """Chunk Java code - split by 1000 chars for now"""
@@ -19,4 +33,47 @@ def chunk_typescript_file(code: str):
 
 def chunk_generic_file(code: str):
     """Generic chunking for any code file"""
-    return [code[i:i+1000] for i in range(0, len(code), 1000)]
\ No newline at end of file
+    return [code[i:i+1000] for i in range(0, len(code), 1000)]
+
+def chunk_start_lines(chunks: List[str]) -> List[int]:
+    """1-based line number each chunk starts on, in a single pass.
+
+    Chunks are contiguous slices of the file, so each start line is the
+    previous one plus the newlines in the previous chunk.
+    """
+    start_lines = []
+    line = 1
+    for chunk in chunks:
+        start_lines.append(line)
+        line += chunk.count("\n")
+    return start_lines
+
+def cached_chunks(chunker: Callable[[str], List[str]], code: str) -> List[Tuple[str, int]]:
+    """Memoized `chunker(code)` paired with each chunk's 1-based start line.
+
+    Keys on a 16-byte blake2b digest, not the full text; a hit skips both the
+    chunking and the newline counting.
+    """
+    key = (chunker.__name__, hashlib.blake2b(code.encode(), digest_size=16).digest())
+    with _chunk_cache_lock:
+        chunks = _chunk_cache.get(key)
+    if chunks is None:
+        pieces = chunker(code)
+        chunks = tuple(zip(pieces, chunk_start_lines(pieces)))
+        if len(code) <= CHUNK_CACHE_MAX_CHARS:
+            with _chunk_cache_lock:
+                _chunk_cache[key] = chunks
+    return list(chunks)
+
+def batch_chunks(chunks: List[Tuple[str, int]], size: int) -> List[Tuple[str, int]]:
+    """Merge every `size` consecutive (chunk, start_line) pairs into one.
+
+    Chunks are contiguous slices of the file, so each merged chunk is itself a
+    slice starting at its first piece's start line.
+    """
+    if size <= 1:
+        return chunks
+    return [
+        ("".join(chunk for chunk, _ in chunks[i:i + size]), chunks[i][1])
+        for i in range(0, len(chunks), size)
+    ]
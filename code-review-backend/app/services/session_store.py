@@ -0,0 +1,60 @@
+"""
+Server-side session store mapping app user ids to GitHub access tokens.
+
+Tokens live in Redis when the app has a Redis client (REDIS_URL), so every
+Uvicorn worker sees the same sessions; otherwise they are kept in-process.
+"""
+import logging
+from typing import Optional
+
+import redis.asyncio as redis
+from cachetools import TTLCache
+
+
+class SessionStoreUnavailable(Exception):
+    """Raised when a session cannot be saved because Redis is failing."""
+
+
+class SessionStore:
+    """GitHub access tokens keyed by user id, expiring after `ttl` seconds."""
+
+    # How long a worker reuses a token read from Redis before re-reading it
+    LOCAL_TTL_SECONDS = 60
+
+    def __init__(self, redis_client: Optional[redis.Redis], ttl: int):
+        self.redis = redis_client
+        self.ttl = ttl
+        # Full session store without Redis; a short read-through cache with it
+        local_ttl = ttl if redis_client is None else min(ttl, self.LOCAL_TTL_SECONDS)
+        self._local = TTLCache(maxsize=50_000, ttl=local_ttl)
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f"session:{user_id}:github_token"
+
+    async def set_github_token(self, user_id: str, github_token: str) -> None:
+        if self.redis is not None:
+            try:
+                await self.redis.set(self._key(user_id), github_token, ex=self.ttl)
+            except (redis.RedisError, OSError) as e:
+                # Other workers would not see a local-only session; fail the login
+                logging.error("Session write to Redis failed: %s", e)
+                raise SessionStoreUnavailable(str(e)) from e
+        self._local[user_id] = github_token
+
+    async def github_token(self, user_id: str) -> Optional[str]:
+        github_token = self._local.get(user_id)
+        if github_token is not None or self.redis is None:
+            return github_token
+
+        try:
+            raw = await self.redis.get(self._key(user_id))
+        except (redis.RedisError, OSError) as e:
+            # Only the local cache can answer while Redis is failing
+            logging.warning("Session read from Redis failed: %s", e)
+            return None
+        if raw is None:
+            return None
+        github_token = raw.decode() if isinstance(raw, bytes) else raw
+        self._local[user_id] = github_token
+        return github_token